@@ -197,6 +197,13 @@ def prepare_orfs_cmd(
     help=("Whether output all ORFs including those " "non-translating ones"),
     is_flag=True,
 )
+@click.option(
+    "--threads",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of worker processes used for scoring ORFs",
+)
 def detect_orfs_cmd(
     bam,
     ribotricer_index,
@@ -210,6 +217,7 @@ def detect_orfs_cmd(
     min_valid_codons_ratio,
     min_read_density,
     report_all,
+    threads,
 ):
     if not os.path.isfile(bam):
         sys.exit("Error: BAM file not found")
@@ -254,6 +262,7 @@ def detect_orfs_cmd(
         min_valid_codons_ratio,
         min_read_density,
         report_all,
+        threads,
     )
 
 
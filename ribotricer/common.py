@@ -16,6 +16,9 @@
 import ntpath
 import pathlib
 import sys
+
+import numpy as np
+
 from .interval import Interval
 
 # Source: https://broadinstitute.github.io/picard/explain-flags.html
@@ -66,22 +69,27 @@ def merge_intervals(intervals):
                       sorted and merged intervals
     """
 
-    intervals = sorted(intervals, key=lambda x: x.start)
-    merged_intervals = []
-    i = 0
-    while i < len(intervals):
-        to_merge = Interval(
-            intervals[i].chrom,
-            intervals[i].start,
-            intervals[i].end,
-            intervals[i].strand,
-        )
-        while i + 1 < len(intervals) and intervals[i + 1].start <= to_merge.end:
-            to_merge.end = max(to_merge.end, intervals[i + 1].end)
-            i += 1
-        merged_intervals.append(to_merge)
-        i += 1
-    return merged_intervals
+    if not intervals:
+        return []
+    n = len(intervals)
+    starts = np.fromiter((x.start for x in intervals), dtype=np.int64, count=n)
+    ends = np.fromiter((x.end for x in intervals), dtype=np.int64, count=n)
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+    ends = ends[order]
+    # an interval opens a new group iff it starts beyond the furthest end
+    # reached by all intervals before it in start order
+    running_end = np.maximum.accumulate(ends)
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    np.greater(starts[1:], running_end[:-1], out=new_group[1:])
+    group_heads = np.flatnonzero(new_group)
+    merged_ends = np.maximum.reduceat(ends, group_heads)
+    # chrom/strand carry over from the first interval of each group
+    return [
+        Interval(intervals[order[i]].chrom, int(s), int(e), intervals[order[i]].strand)
+        for i, s, e in zip(group_heads, starts[group_heads], merged_ends)
+    ]
 
 
 def mkdir_p(path):
@@ -27,23 +27,45 @@ from .const import MINIMUM_VALID_CODONS
 from .const import CUTOFF
 from .common import parent_dir
 from .common import mkdir_p
-from .common import collapse_coverage_to_codon
 from .bam import split_bam
-from quicksect import Interval, IntervalTree
-from collections import Counter
 from collections import defaultdict
+from itertools import islice
 import datetime
+import multiprocessing
+import os
 
 import numpy as np
+import pandas as pd
 from tqdm.autonotebook import tqdm
 
 tqdm.pandas()
 
 
-# Required for IntervalTree
+# numeric strand stored in the refseq arrays
 STRAND_TO_NUM = {"+": 1, "-": -1}
 
 
+def _refseq_arrays(entries):
+    """Convert one chromosome's (start, end, strand) gene records into
+    parallel arrays sorted by start, plus the running maximum of the
+    ends, which together support binary-search overlap queries.
+
+    Parameters
+    ----------
+    entries: List[tuple]
+             (start, end, strand) for each annotated gene
+
+    Returns
+    -------
+    refseq_arrays: tuple
+                   (starts, ends, strands, max_ends) np.int32 arrays
+    """
+    entries.sort()
+    entries = np.array(entries, dtype=np.int32)
+    starts, ends, strands = entries[:, 0], entries[:, 1], entries[:, 2]
+    return (starts, ends, strands, np.maximum.accumulate(ends))
+
+
 def merge_read_lengths(alignments, psite_offsets):
     """
     Merge read counts for different read lengths after
@@ -58,20 +80,47 @@ def merge_read_lengths(alignments, psite_offsets):
     Returns
     -------
     merged_alignments: dict(dict)
-                       alignments by merging all lengths
+                       strand -> chrom -> (positions, counts) where positions
+                       is a sorted np.int32 array and counts the parallel
+                       np.int32 array of read counts
     """
     # print('merging different lengths...')
-    merged_alignments = defaultdict(Counter)
-
+    # Unpack each (length, strand) counter into parallel arrays and apply
+    # the P-site offset to all positions at once
+    by_strand = defaultdict(list)
     for length, offset in list(psite_offsets.items()):
         for strand in alignments[length]:
-            for chrom, pos in alignments[length][strand]:
-                count = alignments[length][strand][(chrom, pos)]
-                if strand == "+":
-                    pos_shifted = pos + offset
-                else:
-                    pos_shifted = pos - offset
-                merged_alignments[strand][(chrom, pos_shifted)] += count
+            counter = alignments[length][strand]
+            if not counter:
+                continue
+            chroms, positions = zip(*counter.keys())
+            positions = np.fromiter(positions, dtype=np.int32, count=len(counter))
+            counts = np.fromiter(counter.values(), dtype=np.int32, count=len(counter))
+            if strand == "+":
+                positions = positions + offset
+            else:
+                positions = positions - offset
+            by_strand[strand].append((np.array(chroms, dtype=object), positions, counts))
+
+    # Aggregate counts landing on the same shifted position and store per
+    # chromosome as parallel sorted position/count arrays so that coverage
+    # lookups can be done with vectorized binary searches instead of
+    # hashing one (chrom, pos) tuple per nucleotide
+    merged_alignments = defaultdict(dict)
+    for strand, parts in by_strand.items():
+        merged = pd.DataFrame(
+            {
+                "chrom": np.concatenate([chroms for chroms, _, _ in parts]),
+                "pos": np.concatenate([positions for _, positions, _ in parts]),
+                "count": np.concatenate([counts for _, _, counts in parts]),
+            }
+        )
+        for chrom, per_chrom in merged.groupby("chrom", sort=False):
+            aggregated = per_chrom.groupby("pos", sort=True)["count"].sum()
+            merged_alignments[strand][chrom] = (
+                aggregated.index.to_numpy(dtype=np.int32),
+                aggregated.to_numpy(dtype=np.int32),
+            )
     return merged_alignments
 
 
@@ -91,26 +140,18 @@ def parse_ribotricer_index(ribotricer_index):
                ORFs of CDS annotated
     novel: List[ORF]
            list of non-annotated ORFs
-    refseq: defaultdict(IntervalTree)
-            chrom: (start, end, strand)
+    refseq: dict
+            chrom: (starts, ends, strands, max_ends) sorted arrays
     """
 
     annotated = []
-    refseq = defaultdict(IntervalTree)
+    refseq = defaultdict(list)
 
-    # First count the number of
-    # annotated regions to count.
     # The annotated regions appear first in the index file
     # so need to read only upto a point where the regions
     # no longer have the annotated tag.
-    total_lines = 0
-    with open(ribotricer_index, "r") as anno:
-        # read header
-        anno.readline()
-        while "annotated" in anno.readline():
-            total_lines += 1
     with open(ribotricer_index, "r") as anno:
-        with tqdm(total=total_lines, unit="lines", leave=False) as pbar:
+        with tqdm(unit="lines", leave=False) as pbar:
             # read header
             anno.readline()
             line = anno.readline()
@@ -118,8 +159,8 @@ def parse_ribotricer_index(ribotricer_index):
                 pbar.update()
                 orf = ORF.from_string(line)
                 if orf is not None and orf.category == "annotated":
-                    refseq[orf.chrom].insert(
-                        Interval(
+                    refseq[orf.chrom].append(
+                        (
                             orf.intervals[0].start,
                             orf.intervals[-1].end,
                             STRAND_TO_NUM[orf.strand],
@@ -127,6 +168,7 @@ def parse_ribotricer_index(ribotricer_index):
                     )
                     annotated.append(orf)
                 line = anno.readline()
+    refseq = {chrom: _refseq_arrays(entries) for chrom, entries in refseq.items()}
     return (annotated, refseq)
 
 
@@ -136,8 +178,8 @@ def orf_coverage(orf, alignments, offset_5p=0, offset_3p=0):
     ----------
     orf: ORF
          instance of ORF
-    alignments: dict(Counter)
-                alignments summarized from bam by merging lengths
+    alignments: dict(dict)
+                strand -> chrom -> (positions, counts) from merge_read_lengths
     offset_5p: int
                the number of nts to include from 5'prime
     offset_3p: int
@@ -145,57 +187,132 @@ def orf_coverage(orf, alignments, offset_5p=0, offset_3p=0):
 
     Returns
     -------
-    coverage: array
+    coverage: np.array
               coverage for ORF
     """
-    coverage = []
     chrom = orf.chrom
     strand = orf.strand
     if strand == "-":
         offset_5p, offset_3p = offset_3p, offset_5p
     first, last = orf.intervals[0], orf.intervals[-1]
-    for pos in range(first.start - offset_5p, first.start):
-        if orf.category == "annotated":
-            try:
-                coverage.append(alignments[strand][(chrom, pos)])
-            except KeyError:
-                coverage.append(0)
-        else:
-            if strand in alignments and (chrom, pos) in alignments[strand]:
-                coverage.append(alignments[strand][(chrom, pos)])
-            else:
-                coverage.append(0)
-
-    for interval in orf.intervals:
-        for pos in range(interval.start, interval.end + 1):
-            if orf.category == "annotated":
-                try:
-                    coverage.append(alignments[strand][(chrom, pos)])
-                except KeyError:
-                    coverage.append(0)
-            else:
-                if strand in alignments and (chrom, pos) in alignments[strand]:
-                    coverage.append(alignments[strand][(chrom, pos)])
-                else:
-                    coverage.append(0)
-
-    for pos in range(last.end + 1, last.end + offset_3p + 1):
-        if orf.category == "annotated":
-            try:
-                coverage.append(alignments[strand][(chrom, pos)])
-            except KeyError:
-                coverage.append(0)
-        else:
-            if strand in alignments and (chrom, pos) in alignments[strand]:
-                coverage.append(alignments[strand][(chrom, pos)])
-            else:
-                coverage.append(0)
-
+    positions = orf.positions
+    if offset_5p or offset_3p:
+        positions = np.concatenate(
+            (
+                np.arange(first.start - offset_5p, first.start),
+                positions,
+                np.arange(last.end + 1, last.end + offset_3p + 1),
+            )
+        )
+    try:
+        mapped_positions, counts = alignments[strand][chrom]
+    except KeyError:
+        coverage = np.zeros(len(positions), dtype=int)
+    else:
+        # one binary search per position; a position is covered only if it
+        # is actually present in the sorted array of mapped positions
+        indices = np.searchsorted(mapped_positions, positions)
+        indices[indices == len(mapped_positions)] = 0
+        hits = mapped_positions[indices] == positions
+        coverage = np.where(hits, counts[indices], 0)
     if strand == "-":
-        coverage.reverse()
+        coverage = coverage[::-1]
     return coverage
 
 
+def _format_orf_row(
+    line,
+    merged_alignments,
+    phase_score_cutoff,
+    min_valid_codons,
+    min_reads_per_codon,
+    min_valid_codons_ratio,
+    min_density_over_orf,
+    report_all,
+):
+    """Score a single index line and format its output row.
+
+    Returns
+    -------
+    row: str or None
+         formatted TSV row, or None for a nontranslating ORF when
+         report_all is unset
+    """
+    orf = ORF.from_string(line)
+    cov = orf_coverage(orf, merged_alignments)
+    length = len(cov)
+    coh, valid_codons = phasescore(cov)
+    n_codons = max(1, length // 3)
+
+    # codon level coverage in one reduction; its total doubles
+    # as the read count so the profile is only traversed once
+    codon_coverage = np.add.reduceat(cov, np.arange(0, length, 3))
+    count = int(codon_coverage.sum())
+    valid_codons_ratio = valid_codons / n_codons
+    # total reads in the ORF divided by the length
+    orf_density = count / n_codons
+    codon_coverage_exceeds_min = codon_coverage >= min_reads_per_codon
+    status = (
+        "translating"
+        if (
+            coh >= phase_score_cutoff
+            and valid_codons >= min_valid_codons
+            and np.all(codon_coverage_exceeds_min)
+            and valid_codons_ratio >= min_valid_codons_ratio
+            and orf_density >= min_density_over_orf
+        )
+        else "nontranslating"
+    )
+    # skip outputing nontranslating ones
+    if not report_all and status == "nontranslating":
+        return None
+    fields = (
+        orf.oid,
+        orf.category,
+        status,
+        coh,
+        count,
+        length,
+        valid_codons,
+        valid_codons_ratio,
+        orf_density,
+        orf.tid,
+        orf.ttype,
+        orf.gid,
+        orf.gname,
+        orf.gtype,
+        orf.chrom,
+        orf.strand,
+        orf.start_codon,
+        cov.tolist(),
+    )
+    return "\t".join(map(str, fields)) + "\n"
+
+
+# Worker state for parallel ORF scoring; populated once per worker process
+# so the merged alignments are not pickled along with every chunk of lines
+_SCORE_WORKER_ARGS = None
+
+
+def _init_score_worker(args):
+    global _SCORE_WORKER_ARGS
+    _SCORE_WORKER_ARGS = args
+
+
+def _score_chunk(lines):
+    """Score a chunk of index lines.
+
+    Returns
+    -------
+    n_bytes: int
+             total length of the input lines, for progress reporting
+    rows: list
+          formatted rows (with None entries for skipped ORFs)
+    """
+    rows = [_format_orf_row(line, *_SCORE_WORKER_ARGS) for line in lines]
+    return sum(map(len, lines)), rows
+
+
 def export_orf_coverages(
     ribotricer_index,
     merged_alignments,
@@ -206,6 +323,7 @@ def export_orf_coverages(
     min_valid_codons_ratio=MINIMUM_VALID_CODONS_RATIO,
     min_density_over_orf=MINIMUM_DENSITY_OVER_ORF,
     report_all=False,
+    threads=1,
 ):
     """
     Parameters
@@ -218,6 +336,8 @@ def export_orf_coverages(
             prefix for output file
     report_all: bool
                 if True, all coverages will be exported
+    threads: int
+             number of worker processes used for scoring ORFs
     """
     # print('exporting coverages for all ORFs...')
     columns = [
@@ -241,68 +361,55 @@ def export_orf_coverages(
         "profile\n",
     ]
     to_write = "\t".join(columns)
-    formatter = "{}\t" * (len(columns) - 1) + "{}\n"
-    with open(ribotricer_index, "r") as anno:
-        total_lines = len(["" for line in anno])
+    total_bytes = os.path.getsize(ribotricer_index)
 
     with open(ribotricer_index, "r") as anno, open(
-        "{}_translating_ORFs.tsv".format(prefix), "w"
+        "{}_translating_ORFs.tsv".format(prefix), "w", buffering=1 << 20
     ) as output:
         output.write(to_write)
-        with tqdm(total=total_lines, unit="ORFs") as pbar:
+        scoring_args = (
+            merged_alignments,
+            phase_score_cutoff,
+            min_valid_codons,
+            min_reads_per_codon,
+            min_valid_codons_ratio,
+            min_density_over_orf,
+            report_all,
+        )
+        # batch formatted rows and write them in one go to avoid one
+        # formatting + write call per ORF
+        rows = []
+        # track progress in bytes so the index is read only once
+        with tqdm(total=total_bytes, unit="B", unit_scale=True) as pbar:
             # Skip header
-            anno.readline()
-            for line in anno:
-                pbar.update()
-                orf = ORF.from_string(line)
-                cov = orf_coverage(orf, merged_alignments)
-                count = sum(cov)
-                length = len(cov)
-                coh, valid_codons = phasescore(cov)
-                n_codons = max(1, length // 3)
-
-                # codon level coverage
-                codon_coverage = np.array(collapse_coverage_to_codon(cov))
-                valid_codons_ratio = valid_codons / n_codons
-                # total reads in the ORF divided by the length
-                orf_density = np.sum(codon_coverage) / n_codons
-                codon_coverage_exceeds_min = codon_coverage >= min_reads_per_codon
-                status = (
-                    "translating"
-                    if (
-                        coh >= phase_score_cutoff
-                        and valid_codons >= min_valid_codons
-                        and np.all(codon_coverage_exceeds_min)
-                        and valid_codons_ratio >= min_valid_codons_ratio
-                        and orf_density >= min_density_over_orf
-                    )
-                    else "nontranslating"
-                )
-                # skip outputing nontranslating ones
-                if not report_all and status == "nontranslating":
-                    pass
-                else:
-                    to_write = formatter.format(
-                        orf.oid,
-                        orf.category,
-                        status,
-                        coh,
-                        count,
-                        length,
-                        valid_codons,
-                        valid_codons_ratio,
-                        orf_density,
-                        orf.tid,
-                        orf.ttype,
-                        orf.gid,
-                        orf.gname,
-                        orf.gtype,
-                        orf.chrom,
-                        orf.strand,
-                        orf.start_codon,
-                        cov,
-                    )
-                    output.write(to_write)
+            pbar.update(len(anno.readline()))
+            if threads > 1:
+                # ORFs are scored independently, so shard the index into
+                # chunks of lines for the worker processes; imap returns
+                # the chunks in order so the output stays deterministic
+                chunks = iter(lambda: list(islice(anno, 1000)), [])
+                with multiprocessing.Pool(
+                    threads,
+                    initializer=_init_score_worker,
+                    initargs=(scoring_args,),
+                ) as pool:
+                    for n_bytes, chunk_rows in pool.imap(_score_chunk, chunks):
+                        pbar.update(n_bytes)
+                        rows.extend(row for row in chunk_rows if row is not None)
+                        if len(rows) >= 1024:
+                            output.write("".join(rows))
+                            rows = []
+            else:
+                for line in anno:
+                    pbar.update(len(line))
+                    row = _format_orf_row(line, *scoring_args)
+                    if row is not None:
+                        rows.append(row)
+                        if len(rows) >= 1024:
+                            output.write("".join(rows))
+                            rows = []
+            if rows:
+                output.write("".join(rows))
 
 
 def export_wig(merged_alignments, prefix):
@@ -310,25 +417,25 @@ def export_wig(merged_alignments, prefix):
     Parameters
     ----------
     merged_alignments: dict(dict)
-                       alignments by merging all lengths
+                       strand -> chrom -> (positions, counts) from
+                       merge_read_lengths
     prefix: str
             prefix of output wig files
     """
     # print('exporting merged alignments to wig file...')
     for strand in merged_alignments:
-        to_write = ""
-        cur_chrom = ""
-        for chrom, pos in sorted(merged_alignments[strand]):
-            if chrom != cur_chrom:
-                cur_chrom = chrom
-                to_write += "variableStep chrom={}\n".format(chrom)
-            to_write += "{}\t{}\n".format(pos, merged_alignments[strand][(chrom, pos)])
         if strand == "+":
             fname = "{}_pos.wig".format(prefix)
         else:
             fname = "{}_neg.wig".format(prefix)
-        with open(fname, "w") as output:
-            output.write(to_write)
+        with open(fname, "w", buffering=1 << 20) as output:
+            # positions are already sorted per chromosome; dump each
+            # chromosome's arrays straight to the buffered file instead of
+            # accumulating one giant string
+            for chrom in sorted(merged_alignments[strand]):
+                positions, counts = merged_alignments[strand][chrom]
+                output.write("variableStep chrom={}\n".format(chrom))
+                np.savetxt(output, np.column_stack((positions, counts)), fmt="%d\t%d")
 
 
 def detect_orfs(
@@ -344,6 +451,7 @@ def detect_orfs(
     min_valid_codons_ratio,
     min_density_over_orf,
     report_all,
+    threads=1,
 ):
     """
     Parameters
@@ -371,6 +479,8 @@ def detect_orfs(
     report_all: bool
                 Whether to output all ORFs' scores regardless of translation
                 status
+    threads: int
+             Number of worker processes used for scoring ORFs
     """
     now = datetime.datetime.now()
     print(now.strftime("%b %d %H:%M:%S ..... started ribotricer detect-orfs"))
@@ -481,6 +591,7 @@ def detect_orfs(
         min_valid_codons_ratio,
         min_density_over_orf,
         report_all,
+        threads,
     )
     now = datetime.datetime.now()
     print(
@@ -16,13 +16,39 @@
 from collections import Counter
 from .common import is_read_uniq_mapping
 
+import numpy as np
 import pysam
-from quicksect import Interval
 
 # required to convert numeric strands to '+/-'
 NUM_TO_STRAND = {1: "+", -1: "-"}
 
 
+def _overlapping_gene_strands(refseq_chrom, start, end):
+    """Strands of annotated genes overlapping [start, end].
+
+    Parameters
+    ----------
+    refseq_chrom: tuple
+                  (starts, ends, strands, max_ends) arrays for one
+                  chromosome, as built by parse_ribotricer_index
+    start: int
+           left end of the query interval
+    end: int
+         right end of the query interval
+
+    Returns
+    -------
+    strands: np.array
+             numeric strand of each overlapping gene record
+    """
+    starts, ends, strands, max_ends = refseq_chrom
+    # genes starting after the query cannot overlap it, and neither can
+    # any prefix whose running-maximum end lies before the query
+    hi = np.searchsorted(starts, end, side="right")
+    lo = np.searchsorted(max_ends[:hi], start, side="left")
+    return strands[lo:hi][ends[lo:hi] >= start]
+
+
 def infer_protocol(bam, gene_interval_tree, prefix, n_reads=20000):
     """Infer strandedness protocol given a bam file
 
@@ -30,8 +56,8 @@ def infer_protocol(bam, gene_interval_tree, prefix, n_reads=20000):
     ----------
     bam: str
          Path to bam file
-    gene_interval_tree: defaultdict(IntervalTree)
-            chrom: (start, end, strand)
+    gene_interval_tree: dict
+            chrom: (starts, ends, strands, max_ends) sorted arrays
     prefix: str
             Prefix for protocol file
     n_reads: int
@@ -68,17 +94,16 @@ def infer_protocol(bam, gene_interval_tree, prefix, n_reads=20000):
                 mapped_end = read.reference_end
                 chrom = read.reference_name
                 # get corresponding gene's strand
-                interval = list(
-                    set(
-                        gene_interval_tree[chrom].find(
-                            Interval(mapped_start, mapped_end)
-                        )
+                if chrom in gene_interval_tree:
+                    overlapping = _overlapping_gene_strands(
+                        gene_interval_tree[chrom], mapped_start, mapped_end
                     )
-                )
-                if len(interval) == 1:
+                else:
+                    overlapping = []
+                if len(overlapping) == 1:
                     # Filter out genes with ambiguous strand info
                     # (those) that have a tx_start on opposite strands
-                    gene_strand = NUM_TO_STRAND[interval[0].data]
+                    gene_strand = NUM_TO_STRAND[int(overlapping[0])]
                     # count table for mapped strand vs gene strand
                     strandedness["{}{}".format(mapped_strand, gene_strand)] += 1
                     iteration += 1
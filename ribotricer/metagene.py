@@ -85,13 +85,16 @@ def orf_coverage_length(
     if strand == "-":
         offset_5p, offset_3p = offset_3p, offset_5p
 
+    # the (length, strand) counter is loop-invariant; resolve it once
+    # instead of doing two dict lookups per position. Most positions have
+    # no reads, so use get() rather than paying for Counter.__missing__
+    # (or exception handling) on every miss
+    get_count = alignments[length][strand].get
+    append = coverage.append
     for pos in next_genome_pos(
         orf.intervals, max_positions, offset_5p, offset_3p, strand == "-"
     ):
-        try:
-            coverage.append(alignments[length][strand][(chrom, pos)])
-        except KeyError:
-            coverage.append(0)
+        append(get_count((chrom, pos), 0))
 
     if strand == "-":
         from_start = pd.Series(
@@ -15,12 +15,35 @@
 # GNU General Public License for more details.
 
 import sys
+from operator import attrgetter
+
+import numpy as np
+
 from .interval import Interval
 
 
 class ORF:
     """Class for candidate ORF."""
 
+    # one instance is created per index line in the detection hot path, so
+    # avoid carrying a per-instance __dict__
+    __slots__ = (
+        "category",
+        "tid",
+        "ttype",
+        "gid",
+        "gname",
+        "gtype",
+        "chrom",
+        "strand",
+        "intervals",
+        "oid",
+        "seq",
+        "leader",
+        "trailer",
+        "_positions",
+    )
+
     def __init__(
         self,
         category,
@@ -44,18 +67,37 @@ class ORF:
         self.gtype = gene_type
         self.chrom = chrom
         self.strand = strand
-        self.intervals = sorted(intervals, key=lambda x: x.start)
+        # index files store intervals already sorted, in which case this is
+        # a linear scan; attrgetter avoids a lambda call per comparison
+        self.intervals = sorted(intervals, key=attrgetter("start"))
         start = self.intervals[0].start
         end = self.intervals[-1].end
         self.oid = "{}_{}_{}_{}".format(
             transcript_id,
             start,
             end,
-            sum([x.end - x.start + 1 for x in self.intervals]),
+            sum(x.end - x.start + 1 for x in self.intervals),
         )
         self.seq = seq
         self.leader = leader
         self.trailer = trailer
+        self._positions = None
+
+    @property
+    def positions(self):
+        """Genomic positions covered by the ORF, as one sorted array.
+
+        Built lazily on first access and cached, so ORFs that are never
+        scored (e.g. during prepare-orfs) pay nothing for it.
+        """
+        if self._positions is None:
+            self._positions = np.concatenate(
+                [
+                    np.arange(interval.start, interval.end + 1, dtype=np.int32)
+                    for interval in self.intervals
+                ]
+            )
+        return self._positions
 
     @property
     def start_codon(self):
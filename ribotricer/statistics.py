@@ -14,14 +14,19 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
-from math import sin, cos, pi, sqrt
-import warnings
+from functools import lru_cache
+from math import sqrt
 
 import numpy as np
 from scipy import stats
-from scipy import signal
 
+# DFT basis at frequency 1/3 evaluated per codon:
+# cos(2*pi/3) = cos(4*pi/3) = -1/2 and sin(2*pi/3) = -sin(4*pi/3) = sqrt(3)/2.
+# The exact constants keep codons with three equal counts at exactly zero norm.
+SIN_2PI_3 = sqrt(3) / 2
 
+
+@lru_cache(maxsize=1 << 16)
 def pvalue(x, N):
     """Calculate p-value for phase score
 
@@ -36,12 +41,51 @@ def pvalue(x, N):
     -------
     pval: double
           p-value for the phase score
+
+    ncx2.sf is an expensive special-function evaluation and phase scores
+    repeat across ORFs, so results are memoized on the exact (x, N) pair.
     """
     df, nc = 2, 2.0 / (N - 1)
     x = 2 * N ** 2 * x / (N - 1)
     return stats.ncx2.sf(x, df, nc)
 
 
+def _frame_coherence(codons):
+    """Coherence of one frame's codons against the uniform 1-0-0 signal.
+
+    Parameters
+    ----------
+    codons: np.array
+            (n_codons, 3) view of the coverage profile for one frame
+
+    Returns
+    -------
+    score: float
+           periodicity score for this frame
+    n_codons: int
+              number of valid (non-zero) codons
+    """
+    # drop codons with zero coverage at all three positions
+    keep = codons.any(axis=1)
+    if not keep.all():
+        codons = codons[keep]
+    n_codons = len(codons)
+    if n_codons == 0:
+        return 0.0, 0
+    real = codons[:, 0] - 0.5 * (codons[:, 1] + codons[:, 2])
+    image = SIN_2PI_3 * (codons[:, 1] - codons[:, 2])
+    norm = np.hypot(real, image)
+    norm[norm == 0] = 1
+    # Each codon contributes a unit (or zero) phase vector
+    # z = (real + i * image) / norm, for which Welch's estimate with
+    # nperseg=3 and noverlap=0 reduces to |mean(z)|^2 / mean(|z|^2).
+    z = (real + 1j * image) / norm
+    power = np.mean(np.abs(z) ** 2)
+    if power == 0:
+        return 0.0, n_codons
+    return np.abs(np.mean(z)) ** 2 / power, n_codons
+
+
 def phasescore(original_values):
     """Calculate phase score of a given signal.
 
@@ -61,51 +105,17 @@ def phasescore(original_values):
 
     """
     coh, valid = 0.0, -1
+    original_values = np.asarray(original_values, dtype=float)
     for frame in [0, 1, 2]:
         values = original_values[frame:]
-        normalized_values = []
-        i = 0
-        while i + 2 < len(values):
-            if values[i] == values[i + 1] == values[i + 2] == 0:
-                i += 3
-            else:
-                real = (
-                    values[i]
-                    + values[i + 1] * cos(2 * pi / 3)
-                    + values[i + 2] * cos(4 * pi / 3)
-                )
-                image = values[i + 1] * sin(2 * pi / 3) + values[i + 2] * sin(
-                    4 * pi / 3
-                )
-                norm = sqrt(real ** 2 + image ** 2)
-                if norm == 0:
-                    norm = 1
-                normalized_values += [
-                    values[i] / norm,
-                    values[i + 1] / norm,
-                    values[i + 2] / norm,
-                ]
-                i += 3
-
-        length = len(normalized_values) // 3 * 3
-        if length == 0:
+        codons = values[: 3 * (len(values) // 3)].reshape(-1, 3)
+        periodicity_score, n_codons = _frame_coherence(codons)
+        if n_codons == 0:
             coh, valid = (0.0, 0)
         else:
-            normalized_values = normalized_values[:length]
-            uniform_signal = [1, 0, 0] * (len(normalized_values) // 3)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                f, Cxy = signal.coherence(
-                    normalized_values,
-                    uniform_signal,
-                    window=[1.0, 1.0, 1.0],
-                    nperseg=3,
-                    noverlap=0,
-                )
-                periodicity_score = Cxy[np.argwhere(np.isclose(f, 1 / 3.0))[0]][0]
-                if periodicity_score > coh:
-                    coh = periodicity_score
-                    valid = length // 3
-                if valid == -1:
-                    valid = length // 3
+            if periodicity_score > coh:
+                coh = periodicity_score
+                valid = n_codons
+            if valid == -1:
+                valid = n_codons
     return np.sqrt(coh), valid
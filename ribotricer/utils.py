@@ -14,7 +14,7 @@
 # GNU General Public License for more details.
 
 from collections import defaultdict
-from .statistics import phasescore
+from .statistics import SIN_2PI_3, phasescore
 
 import numpy as np
 from tqdm.autonotebook import tqdm
@@ -213,23 +213,15 @@ def benchmark(rna_file, ribo_file, prefix, cutoff=5):
 
 
 def angle(cov, frame):
-    ans = []
-    nzeros = 0
-    cov = cov[frame:]
-    i = 0
-    while i + 2 < len(cov):
-        if cov[i] == cov[i + 1] == cov[i + 2] == 0:
-            i += 3
-            nzeros += 1
-        else:
-            real = cov[i] - 0.5 * (cov[i + 1] + cov[i + 2])
-            img = np.sqrt(3) / 2 * (cov[i + 1] - cov[i + 2])
-            if real == img == 0:
-                i += 3
-            else:
-                ans.append(np.arctan2(img, real))
-                i += 3
-    return ans, nzeros
+    cov = np.asarray(cov[frame:], dtype=float)
+    codons = cov[: 3 * (len(cov) // 3)].reshape(-1, 3)
+    nzeros = int(np.count_nonzero(~codons.any(axis=1)))
+    real = codons[:, 0] - 0.5 * (codons[:, 1] + codons[:, 2])
+    img = SIN_2PI_3 * (codons[:, 1] - codons[:, 2])
+    # degenerate codons (all three positions equal) have no defined angle;
+    # the empty ones among them are tallied above
+    keep = (real != 0) | (img != 0)
+    return np.arctan2(img[keep], real[keep]).tolist(), nzeros
 
 
 def theta_dist(rna_file, ribo_file, frame_file, prefix, cutoff=5):